@@ -8,12 +8,16 @@ Supports downloading by year or last X days, with progress feedback and retry lo
 
 import os
 import sys
+import argparse
 import logging
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from pathlib import Path
-from typing import List, Tuple, Optional
-from bs4 import BeautifulSoup
+from typing import Iterable, List, Tuple, Optional
+from selectolax.lexbor import LexborHTMLParser
 from tqdm import tqdm
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -23,7 +27,7 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from urllib.parse import urlparse, parse_qs, unquote
+from urllib.parse import urlparse, unquote
 import re
 
 # Configure logging
@@ -41,42 +45,80 @@ logger = logging.getLogger(__name__)
 BASE_URL_SHORTCUT = "http://pesquisa.doe.seplag.ce.gov.br/doepesquisa/sead.do?page=ultimasDetalhe&cmd=10&action=Cadernos&data="
 BASE_URL_MAIN = "http://pesquisa.doe.seplag.ce.gov.br/doepesquisa/sead.do?page=ultimasEdicoes&cmd=11&action=Ultimas"
 BASE_DIR = "diarios_ceara"
+MAX_WORKERS = 16  # concurrent shortcut page requests
+CHUNK_SIZE = 1 << 18  # 256 KiB per iter_content read when downloading PDFs
+SMALL_PAGE_SIZE = 4096  # shortcut pages below this size are checked for link markers before parsing
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
+# Shared session: keep-alive connection pool plus a single retry/backoff policy for all requests
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# chromedriver path, resolved once by get_chromedriver_path() and cached on disk across runs
+DRIVER_PATH = None
+DRIVER_CACHE_FILE = Path.home() / '.cache' / 'rede-cnpj' / 'chromedriver_path'
+DRIVER_CACHE_TTL = 7 * 24 * 3600  # seconds before ChromeDriverManager is asked again
+
+# Precompiled patterns (PDF name in URL path, Content-Disposition filename, "no publications" page text)
+_PDF_IN_PATH = re.compile(r'([^/]+\.pdf)', re.IGNORECASE)
+_CD_FILENAME = re.compile(r'filename[^;=\n]*=(([\'"]).*?\2|[^;\n]*)', re.IGNORECASE)
+_NO_PUB = re.compile('não há|sem dados|nenhuma publicação|não existem')
+_UNSAFE = re.compile(r'[^\w._\- ]')
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+# Byte substrings that any link accepted by test_shortcut_url must contain
+_LINK_MARKERS = (b'.pdf', b'download', b'baixar')
+
+# Names and link texts that carry no information about the document
+_GENERIC_NAMES = frozenset({'visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf', 'documento.pdf'})
+_GENERIC_LINKTEXT = frozenset({'visualizar', 'baixar', 'download', 'ver'})
+# Query parameters that may carry the PDF filename, in priority order (fixed, so names are stable across runs)
+_FILENAME_PARAM_ORDER = ('arquivo', 'file', 'filename', 'nome', 'documento')
+
 
 def extract_filename_from_url(url: str) -> Optional[str]:
     """
-    Extract filename from URL by checking query parameters, path, and Content-Disposition.
+    Extract filename from URL by checking query parameters and path.
     
     Args:
         url: URL to extract filename from
         
     Returns:
-        Filename if found, None otherwise
+        Filename if found (still percent-encoded; resolve_filename unquotes it), None otherwise
     """
     try:
         parsed = urlparse(url)
         
         # Check query parameters for common filename parameters
-        query_params = parse_qs(parsed.query)
-        for param in ['arquivo', 'file', 'filename', 'nome', 'documento']:
-            if param in query_params:
-                filename = query_params[param][0]
+        if parsed.query:
+            # Split by hand instead of parse_qs, which would percent-decode values a second time
+            query_params = {}
+            for pair in parsed.query.split('&'):
+                key, _, value = pair.partition('=')
+                query_params.setdefault(unquote(key), value.replace('+', ' '))
+            for param in _FILENAME_PARAM_ORDER:
+                filename = query_params.get(param)
                 if filename and filename.lower().endswith('.pdf'):
-                    return unquote(filename)
+                    return filename
         
         # Check path for PDF filename
         path = parsed.path
         if path:
             # Look for .pdf in the path
-            pdf_match = re.search(r'([^/]+\.pdf)', path, re.IGNORECASE)
+            pdf_match = _PDF_IN_PATH.search(path)
             if pdf_match:
-                return unquote(pdf_match.group(1))
+                return pdf_match.group(1)
             
             # Get last part of path
             basename = os.path.basename(path)
             if basename and basename.lower().endswith('.pdf'):
-                return unquote(basename)
+                return basename
         
         return None
     except Exception as e:
@@ -84,29 +126,78 @@ def extract_filename_from_url(url: str) -> Optional[str]:
         return None
 
 
-def get_filename_from_content_disposition(url: str, headers: dict) -> Optional[str]:
+def decode_page(response: requests.Response) -> str:
     """
-    Try to get filename from Content-Disposition header by making a HEAD request.
+    Decode an HTML response for the lexbor parser, which reads bytes as UTF-8.
     
     Args:
-        url: URL to check
-        headers: Headers to use for request
+        response: HTTP response with the page
         
     Returns:
-        Filename if found in Content-Disposition header, None otherwise
+        Page text using the HTTP header charset, else the <meta charset>,
+        else UTF-8 with a Windows-1252 fallback (same rule as parse_html in tse/dados_tse_baixa.py)
     """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.text
+    meta = _META_CHARSET.search(response.content[:2048])
+    if meta:
+        try:
+            return response.content.decode(meta.group(1).decode('ascii'), errors='replace')
+        except LookupError:
+            pass  # unknown charset name
     try:
-        response = requests.head(url, headers=headers, timeout=10, allow_redirects=True)
-        content_disposition = response.headers.get('Content-Disposition', '')
-        if content_disposition:
-            # Parse Content-Disposition: attachment; filename="file.pdf"
-            filename_match = re.search(r'filename[^;=\n]*=(([\'"]).*?\2|[^;\n]*)', content_disposition, re.IGNORECASE)
-            if filename_match:
-                filename = filename_match.group(1).strip('"\'')
-                return unquote(filename)
-    except Exception:
-        pass
-    return None
+        return response.content.decode('utf-8')
+    except UnicodeDecodeError:
+        return response.content.decode('cp1252', errors='replace')
+
+
+def resolve_filename(url: str, cell_texts: Iterable[str], link_text: str) -> str:
+    """
+    Pick a filename for a PDF link from the URL, the row cells, or the link text.
+    No request is made: download_file renames generic names from the GET's Content-Disposition.
+    
+    Args:
+        url: Absolute link URL
+        cell_texts: Texts of the cells in the link's row (consumed lazily)
+        link_text: Text of the link itself
+        
+    Returns:
+        Filename ending in .pdf
+    """
+    # Each method only runs while the name so far is missing or generic; lowercase each candidate once
+    # Method 1: Extract from URL
+    filename = extract_filename_from_url(url)
+    generic = not filename or filename.lower() in _GENERIC_NAMES
+    
+    # Method 2: Look in table cells (often filename is in adjacent cell)
+    if generic:
+        for cell_text in cell_texts:
+            if not cell_text:
+                continue
+            lowered = cell_text.lower()
+            # Skip if it's the link text or common action words
+            if lowered not in _GENERIC_LINKTEXT and (lowered.endswith('.pdf') or len(cell_text) > 5):
+                if not lowered.endswith('.pdf'):
+                    cell_text += '.pdf'
+                    lowered += '.pdf'
+                filename = cell_text
+                generic = lowered in _GENERIC_NAMES
+                break
+    
+    # Method 3: Use link text if it's not a generic action word
+    if generic:
+        if link_text and link_text.lower() not in _GENERIC_LINKTEXT:
+            filename = link_text
+        else:
+            # Fallback: use basename from URL
+            filename = os.path.basename(urlparse(url).path) or 'documento.pdf'
+    
+    # Ensure .pdf extension
+    if not filename.lower().endswith('.pdf'):
+        filename += '.pdf'
+    
+    # Clean filename (unquoted once, here)
+    return unquote(filename)
 
 
 def test_shortcut_url(date_str: str) -> Tuple[bool, List[Tuple[str, str]]]:
@@ -120,107 +211,80 @@ def test_shortcut_url(date_str: str) -> Tuple[bool, List[Tuple[str, str]]]:
         Tuple of (success: bool, links: List[Tuple[filename, url]])
     """
     url = BASE_URL_SHORTCUT + date_str
-    headers = {'User-Agent': USER_AGENT}
     
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = SESSION.get(url, timeout=30)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # Short stub pages (invalid dates, weekends) without any link marker: no links can match, skip parsing
+        content = response.content
+        if len(content) < SMALL_PAGE_SIZE:
+            lowered = content.lower()
+            if not any(marker in lowered for marker in _LINK_MARKERS):
+                logger.debug(f"No PDF links in short page for {date_str}")
+                return True, []
+        
+        html = decode_page(response)
+        tree = LexborHTMLParser(html)
         
         # Look for table with PDF links
         # Common patterns: links in tables, links with .pdf extension, etc.
         links = []
         
-        # Try to find links in tables
-        tables = soup.find_all('table')
-        for table in tables:
-            rows = table.find_all('tr')
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
-                for cell in cells:
-                    link = cell.find('a', href=True)
-                    if not link:
-                        continue
-                    
-                    href = link.get('href', '')
-                    if not ('.pdf' in href.lower() or 'download' in href.lower() or 'baixar' in href.lower()):
-                        continue
-                    
-                    # Make absolute URL if relative
-                    if href.startswith('/'):
-                        full_url = f"http://pesquisa.doe.seplag.ce.gov.br{href}"
-                    elif href.startswith('http'):
-                        full_url = href
-                    else:
-                        full_url = f"http://pesquisa.doe.seplag.ce.gov.br/doepesquisa/{href}"
-                    
-                    # Try multiple methods to get filename
-                    filename = None
-                    
-                    # Method 1: Extract from URL
-                    filename = extract_filename_from_url(full_url)
-                    
-                    # Method 2: Look in table cells (often filename is in adjacent cell)
-                    if not filename or filename.lower() in ['visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf']:
-                        for other_cell in cells:
-                            cell_text = other_cell.get_text(strip=True)
-                            # Skip if it's the link text or common action words
-                            if (cell_text and 
-                                cell_text.lower() not in ['visualizar', 'baixar', 'download', 'ver'] and
-                                (cell_text.lower().endswith('.pdf') or len(cell_text) > 5)):
-                                filename = cell_text
-                                if not filename.endswith('.pdf'):
-                                    filename += '.pdf'
-                                break
-                    
-                    # Method 3: Try to get from Content-Disposition header
-                    if not filename or filename.lower() in ['visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf']:
-                        filename = get_filename_from_content_disposition(full_url, headers)
-                    
-                    # Method 4: Use link text if it's not a generic action word
-                    if not filename or filename.lower() in ['visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf']:
-                        link_text = link.get_text(strip=True)
-                        if link_text and link_text.lower() not in ['visualizar', 'baixar', 'download', 'ver']:
-                            filename = link_text
-                        else:
-                            # Fallback: use basename from URL
-                            filename = os.path.basename(urlparse(full_url).path) or 'documento.pdf'
-                    
-                    # Ensure .pdf extension
-                    if not filename.endswith('.pdf'):
-                        filename += '.pdf'
-                    
-                    # Clean filename
-                    filename = unquote(filename)
-                    
-                    links.append((filename, full_url))
+        # Try to find links in tables: one selector for all anchors, then walk up to the cell and row.
+        # Only the first anchor of each cell counts (e.g. "Visualizar | Baixar" is one document)
+        seen_cells = set()
+        for link in tree.css('table tr a[href]'):
+            cell = link.parent
+            while cell is not None and cell.tag not in ('td', 'th'):
+                cell = cell.parent
+            if cell is None or cell.mem_id in seen_cells:
+                continue
+            seen_cells.add(cell.mem_id)
+            
+            href = link.attributes.get('href') or ''
+            href_lower = href.lower()
+            if not ('.pdf' in href_lower or 'download' in href_lower or 'baixar' in href_lower):
+                continue
+            
+            row = cell.parent
+            while row is not None and row.tag != 'tr':
+                row = row.parent
+            
+            # Make absolute URL if relative
+            if href.startswith('/'):
+                full_url = f"http://pesquisa.doe.seplag.ce.gov.br{href}"
+            elif href.startswith('http'):
+                full_url = href
+            else:
+                full_url = f"http://pesquisa.doe.seplag.ce.gov.br/doepesquisa/{href}"
+            
+            filename = resolve_filename(
+                full_url,
+                (cell.text(strip=True) for cell in (row.css('td, th') if row is not None else ())),
+                link.text(strip=True)
+            )
+            
+            links.append((filename, full_url))
         
         # Also check for direct PDF links in the page
         if not links:
-            for link in soup.find_all('a', href=True):
-                href = link.get('href', '')
-                if href.lower().endswith('.pdf'):
-                    if href.startswith('/'):
-                        full_url = f"http://pesquisa.doe.seplag.ce.gov.br{href}"
-                    elif href.startswith('http'):
-                        full_url = href
-                    else:
-                        full_url = f"http://pesquisa.doe.seplag.ce.gov.br/doepesquisa/{href}"
-                    
-                    # Try to extract filename from URL
-                    filename = extract_filename_from_url(full_url)
-                    if not filename:
-                        filename = os.path.basename(urlparse(full_url).path) or 'documento.pdf'
-                    filename = unquote(filename)
-                    if not filename.endswith('.pdf'):
-                        filename += '.pdf'
-                    links.append((filename, full_url))
+            for link in tree.css('a[href$=".pdf" i]'):
+                href = link.attributes.get('href') or ''
+                if href.startswith('/'):
+                    full_url = f"http://pesquisa.doe.seplag.ce.gov.br{href}"
+                elif href.startswith('http'):
+                    full_url = href
+                else:
+                    full_url = f"http://pesquisa.doe.seplag.ce.gov.br/doepesquisa/{href}"
+                
+                # Try to extract filename from URL
+                filename = resolve_filename(full_url, (), '')
+                links.append((filename, full_url))
         
-        # Check if page indicates no publications (e.g., "não há publicações", "sem dados")
-        page_text = soup.get_text().lower()
-        if any(phrase in page_text for phrase in ['não há', 'sem dados', 'nenhuma publicação', 'não existem']):
-            return True, []  # Page loaded but no publications
+        # Only when nothing was found, check if page indicates no publications (e.g., "não há publicações", "sem dados")
+        if not links and _NO_PUB.search(html.lower()):
+            logger.info(f"No publications for {date_str}")
         
         return True, links
         
@@ -245,10 +309,10 @@ def get_user_input() -> Tuple[str, int]:
             if choice == '1':
                 year = input("Enter year (e.g., 2024): ").strip()
                 year_int = int(year)
-                if 2000 <= year_int <= datetime.now().year + 1:
+                if 2000 <= year_int <= datetime.now().year:
                     return ('year', year_int)
                 else:
-                    print(f"Please enter a valid year between 2000 and {datetime.now().year + 1}")
+                    print(f"Please enter a valid year between 2000 and {datetime.now().year}")
             elif choice == '2':
                 days = input("Enter number of days: ").strip()
                 days_int = int(days)
@@ -279,25 +343,15 @@ def generate_dates(mode: str, value: int) -> List[str]:
     dates = []
     
     if mode == 'year':
-        # Generate all dates in the year
-        start_date = datetime(value, 1, 1)
-        # Check if year is current year
-        if value == datetime.now().year:
-            end_date = datetime.now()
-        else:
-            end_date = datetime(value, 12, 31)
-        
-        current_date = start_date
-        while current_date <= end_date:
-            dates.append(current_date.strftime('%Y%m%d'))
-            current_date += timedelta(days=1)
+        # Generate all dates in the year (ordinal range, up to today for the current year)
+        start_ord = date(value, 1, 1).toordinal()
+        end_ord = min(date(value, 12, 31).toordinal(), date.today().toordinal())
+        dates = [date.fromordinal(o).strftime('%Y%m%d') for o in range(start_ord, end_ord + 1)]
     
     elif mode == 'days':
         # Generate last X days from today
-        today = datetime.now()
-        for i in range(value):
-            date = today - timedelta(days=i)
-            dates.append(date.strftime('%Y%m%d'))
+        today_ord = date.today().toordinal()
+        dates = [date.fromordinal(today_ord - i).strftime('%Y%m%d') for i in range(value)]
     
     return dates
 
@@ -332,165 +386,225 @@ def extract_pdf_links_shortcut(date_str: str) -> Tuple[List[Tuple[str, str]], bo
     return (links, success)
 
 
-def extract_pdf_links_selenium(year: int, date_str: str) -> List[Tuple[str, str]]:
+def get_chromedriver_path() -> str:
     """
-    Extract PDF links using Selenium navigation (fallback method).
+    Get the chromedriver path, running ChromeDriverManager().install() at most once per process.
+    The path is also kept in DRIVER_CACHE_FILE so runs within DRIVER_CACHE_TTL skip the manager entirely.
     
-    Args:
-        year: Year as integer
-        date_str: Date in YYYYMMDD format (YYYYMMDD)
-        
     Returns:
-        List of (filename, url) tuples
+        Path to the chromedriver executable
     """
-    driver = None
+    global DRIVER_PATH
+    if DRIVER_PATH is not None:
+        return DRIVER_PATH
+    
     try:
-        # Setup Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument(f'user-agent={USER_AGENT}')
-        
-        # Initialize driver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(30)
-        
-        # Navigate to main page
-        logger.info(f"Navigating to main page for Selenium fallback")
-        driver.get(BASE_URL_MAIN)
-        
-        # Wait for and select year dropdown
-        wait = WebDriverWait(driver, 20)
-        year_select_element = wait.until(
-            EC.presence_of_element_located((By.NAME, "DiarioGrid"))
-        )
-        year_select = Select(year_select_element)
-        year_select.select_by_value(str(year))
-        
-        # Wait for date dropdown to appear
-        date_select_element = wait.until(
-            EC.presence_of_element_located((By.NAME, "DiarioAjaxGridBaixar"))
-        )
-        date_select = Select(date_select_element)
-        
-        # Format date for selection (need to check format - might be DD/MM/YYYY or YYYYMMDD)
-        # Try different formats
-        date_obj = datetime.strptime(date_str, '%Y%m%d')
-        date_formats = [
-            date_obj.strftime('%d/%m/%Y'),
-            date_obj.strftime('%Y-%m-%d'),
-            date_str
-        ]
-        
-        date_selected = False
-        for date_format in date_formats:
+        if datetime.now().timestamp() - DRIVER_CACHE_FILE.stat().st_mtime < DRIVER_CACHE_TTL:
+            cached_path = DRIVER_CACHE_FILE.read_text(encoding='utf-8').strip()
+            if cached_path and os.path.isfile(cached_path):
+                DRIVER_PATH = cached_path
+                return DRIVER_PATH
+    except OSError:
+        pass
+    
+    DRIVER_PATH = ChromeDriverManager().install()
+    try:
+        DRIVER_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        DRIVER_CACHE_FILE.write_text(DRIVER_PATH, encoding='utf-8')
+    except OSError as e:
+        logger.debug(f"Could not cache chromedriver path: {e}")
+    return DRIVER_PATH
+
+
+def reset_chromedriver_path() -> None:
+    """Forget the chromedriver path, in memory and on disk, so the next lookup runs ChromeDriverManager again."""
+    global DRIVER_PATH
+    DRIVER_PATH = None
+    try:
+        DRIVER_CACHE_FILE.unlink()
+    except OSError:
+        pass
+
+
+class SeleniumFallback:
+    """
+    Selenium navigation fallback that owns a single Chrome driver reused across dates.
+    
+    The driver is only launched on the first fetch() and is quit on exit.
+    """
+    
+    def __init__(self):
+        self.driver = None
+        self.driver_refreshed = False  # chromedriver re-installed after a failed launch (done at most once)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.quit()
+        return False
+    
+    def _get_driver(self):
+        """Launch the Chrome driver on first use."""
+        if self.driver is None:
+            # Setup Chrome options
+            chrome_options = Options()
+            chrome_options.add_argument('--headless')
+            chrome_options.add_argument('--no-sandbox')
+            chrome_options.add_argument('--disable-dev-shm-usage')
+            chrome_options.add_argument(f'user-agent={USER_AGENT}')
+            # Only the DOM/table is needed: skip images, CSS and fonts, and return once the DOM is interactive
+            chrome_options.add_experimental_option('prefs', {
+                'profile.managed_default_content_settings.images': 2,
+                'profile.managed_default_content_settings.stylesheets': 2,
+                'profile.managed_default_content_settings.fonts': 2,
+            })
+            chrome_options.page_load_strategy = 'eager'
+
+            # Initialize driver; a cached chromedriver may no longer match Chrome (e.g. after an upgrade),
+            # so on the first launch failure drop the cached path and retry once with a fresh install()
             try:
-                date_select.select_by_value(date_format)
-                date_selected = True
-                break
-            except:
-                try:
-                    date_select.select_by_visible_text(date_format)
-                    date_selected = True
-                    break
-                except:
-                    continue
-        
-        if not date_selected:
-            logger.warning(f"Could not select date {date_str} in dropdown")
-            return []
+                self.driver = webdriver.Chrome(service=Service(get_chromedriver_path()), options=chrome_options)
+            except Exception as e:
+                if self.driver_refreshed:
+                    raise
+                self.driver_refreshed = True
+                logger.warning(f"Chrome driver failed to start ({e}), refreshing chromedriver")
+                reset_chromedriver_path()
+                self.driver = webdriver.Chrome(service=Service(get_chromedriver_path()), options=chrome_options)
+            self.driver.set_page_load_timeout(30)
+        return self.driver
+    
+    def quit(self):
+        """Quit the driver if it was launched."""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logger.debug(f"Error quitting Selenium driver: {e}")
+            self.driver = None
+    
+    @staticmethod
+    def _cell_texts(cells):
+        """Yield stripped cell texts, skipping stale cells."""
+        for cell in cells:
+            try:
+                yield cell.text.strip()
+            except Exception:
+                continue
+    
+    def fetch(self, year: int, date_str: str) -> List[Tuple[str, str]]:
+        """
+        Extract PDF links using Selenium navigation (fallback method).
         
-        # Wait for popup/table to appear
-        # Look for table with links
+        Args:
+            year: Year as integer
+            date_str: Date in YYYYMMDD format (YYYYMMDD)
+            
+        Returns:
+            List of (filename, url) tuples
+        """
         try:
-            table = wait.until(
-                EC.presence_of_element_located((By.TAG_NAME, "table"))
+            driver = self._get_driver()
+            
+            # Navigate to main page
+            logger.info(f"Navigating to main page for Selenium fallback")
+            driver.get(BASE_URL_MAIN)
+            
+            # Wait for and select year dropdown
+            wait = WebDriverWait(driver, 20)
+            year_select_element = wait.until(
+                EC.presence_of_element_located((By.NAME, "DiarioGrid"))
             )
-        except TimeoutException:
-            logger.warning(f"No table found for date {date_str}")
-            return []
-        
-        # Extract links from table
-        links = []
-        rows = table.find_elements(By.TAG_NAME, "tr")
-        
-        for row in rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            for cell in cells:
+            year_select = Select(year_select_element)
+            year_select.select_by_value(str(year))
+            
+            # Wait for date dropdown to appear
+            date_select_element = wait.until(
+                EC.presence_of_element_located((By.NAME, "DiarioAjaxGridBaixar"))
+            )
+            date_select = Select(date_select_element)
+            
+            # Format date for selection (need to check format - might be DD/MM/YYYY or YYYYMMDD)
+            # Try different formats
+            date_obj = datetime.strptime(date_str, '%Y%m%d')
+            date_formats = [
+                date_obj.strftime('%d/%m/%Y'),
+                date_obj.strftime('%Y-%m-%d'),
+                date_str
+            ]
+            
+            date_selected = False
+            for date_format in date_formats:
                 try:
-                    link_elem = cell.find_element(By.TAG_NAME, "a")
-                    href = link_elem.get_attribute('href')
-                    if not href or not ('.pdf' in href.lower() or 'download' in href.lower() or 'baixar' in href.lower()):
+                    date_select.select_by_value(date_format)
+                    date_selected = True
+                    break
+                except:
+                    try:
+                        date_select.select_by_visible_text(date_format)
+                        date_selected = True
+                        break
+                    except:
                         continue
-                    
-                    # Try multiple methods to get filename
-                    filename = None
-                    
-                    # Method 1: Extract from URL
-                    filename = extract_filename_from_url(href)
-                    
-                    # Method 2: Look in table cells (often filename is in adjacent cell)
-                    if not filename or filename.lower() in ['visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf']:
-                        for other_cell in cells:
-                            try:
-                                cell_text = other_cell.text.strip()
-                                # Skip if it's the link text or common action words
-                                if (cell_text and 
-                                    cell_text.lower() not in ['visualizar', 'baixar', 'download', 'ver'] and
-                                    (cell_text.lower().endswith('.pdf') or len(cell_text) > 5)):
-                                    filename = cell_text
-                                    if not filename.endswith('.pdf'):
-                                        filename += '.pdf'
-                                    break
-                            except:
-                                continue
-                    
-                    # Method 3: Try to get from Content-Disposition header
-                    if not filename or filename.lower() in ['visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf']:
-                        filename = get_filename_from_content_disposition(href, {'User-Agent': USER_AGENT})
-                    
-                    # Method 4: Use link text if it's not a generic action word
-                    if not filename or filename.lower() in ['visualizar.pdf', 'visualizar', 'baixar.pdf', 'download.pdf']:
-                        link_text = link_elem.text.strip()
-                        if link_text and link_text.lower() not in ['visualizar', 'baixar', 'download', 'ver']:
-                            filename = link_text
-                        else:
-                            # Fallback: use basename from URL
-                            filename = os.path.basename(urlparse(href).path) or 'documento.pdf'
-                    
-                    # Ensure .pdf extension
-                    if not filename.endswith('.pdf'):
-                        filename += '.pdf'
-                    
-                    # Clean filename
-                    filename = unquote(filename)
-                    
-                    links.append((filename, href))
-                except NoSuchElementException:
-                    continue
-                except Exception as e:
-                    logger.debug(f"Error extracting link from cell: {e}")
-                    continue
-        
-        return links
-        
-    except Exception as e:
-        logger.error(f"Error in Selenium extraction for {date_str}: {e}")
-        return []
-    finally:
-        if driver:
-            driver.quit()
+            
+            if not date_selected:
+                logger.warning(f"Could not select date {date_str} in dropdown")
+                return []
+            
+            # Wait for popup/table to appear
+            # Look for table with links
+            try:
+                table = wait.until(
+                    EC.presence_of_element_located((By.TAG_NAME, "table"))
+                )
+            except TimeoutException:
+                logger.warning(f"No table found for date {date_str}")
+                return []
+            
+            # Extract links from table
+            links = []
+            rows = table.find_elements(By.TAG_NAME, "tr")
+            
+            for row in rows:
+                cells = row.find_elements(By.TAG_NAME, "td")
+                for cell in cells:
+                    try:
+                        link_elem = cell.find_element(By.TAG_NAME, "a")
+                        href = link_elem.get_attribute('href')
+                        if not href or not ('.pdf' in href.lower() or 'download' in href.lower() or 'baixar' in href.lower()):
+                            continue
+                        
+                        filename = resolve_filename(
+                            href,
+                            self._cell_texts(cells),
+                            link_elem.text.strip()
+                        )
+                        
+                        links.append((filename, href))
+                    except NoSuchElementException:
+                        continue
+                    except Exception as e:
+                        logger.debug(f"Error extracting link from cell: {e}")
+                        continue
+            
+            return links
+            
+        except Exception as e:
+            logger.error(f"Error in Selenium extraction for {date_str}: {e}")
+            # Drop the driver so the next date starts from a fresh browser
+            self.quit()
+            return []
 
 
-def should_overwrite_file(filepath: str, remote_size: Optional[int]) -> bool:
+def should_overwrite_file(filepath: str, remote_size: Optional[int], mode: str = 'ask') -> bool:
     """
-    Check if file exists and prompt user to skip or overwrite.
+    Check if file exists and decide, by mode or by prompting the user, whether to skip or overwrite.
     
     Args:
         filepath: Local file path
         remote_size: Remote file size in bytes (if available)
+        mode: 'skip', 'overwrite', 'ask', or 'size' (skip only when local and remote sizes match)
         
     Returns:
         True to overwrite, False to skip
@@ -498,8 +612,16 @@ def should_overwrite_file(filepath: str, remote_size: Optional[int]) -> bool:
     if not os.path.exists(filepath):
         return True
     
+    if mode == 'skip':
+        return False
+    if mode == 'overwrite':
+        return True
+    
     local_size = os.path.getsize(filepath)
     
+    if mode == 'size':
+        return remote_size is None or remote_size != local_size
+    
     if remote_size is None:
         prompt = f"File exists: {os.path.basename(filepath)} (Local: {local_size:,} bytes, Remote size unknown). (s)kip or (o)verwrite? "
     else:
@@ -519,40 +641,44 @@ def should_overwrite_file(filepath: str, remote_size: Optional[int]) -> bool:
             sys.exit(0)
 
 
-def download_file(url: str, filepath: str, max_retries: int = 3) -> Tuple[bool, str]:
+def download_file(url: str, filepath: str, overwrite: str = 'ask', max_retries: int = 3) -> Tuple[bool, str]:
     """
     Download file with progress bar and retry logic.
     Also tries to get actual filename from Content-Disposition header.
+    The SESSION adapter retries connecting and 5xx responses; errors while streaming the body
+    (connection reset, read timeout, broken chunked encoding) are retried here.
     
     Args:
         url: URL to download
         filepath: Local file path to save to
-        max_retries: Maximum number of retry attempts
+        overwrite: How to handle an existing file (see should_overwrite_file)
+        max_retries: Maximum number of attempts
         
     Returns:
         Tuple of (success: bool, status: str) where status is 'downloaded', 'skipped', or 'failed'
     """
-    headers = {'User-Agent': USER_AGENT}
-    
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=headers, stream=True, timeout=60)
+            response = SESSION.get(url, stream=True, timeout=60)
             response.raise_for_status()
             
             # Try to get actual filename from Content-Disposition header
             content_disposition = response.headers.get('Content-Disposition', '')
             actual_filename = None
             if content_disposition:
-                filename_match = re.search(r'filename[^;=\n]*=(([\'"]).*?\2|[^;\n]*)', content_disposition, re.IGNORECASE)
+                filename_match = _CD_FILENAME.search(content_disposition)
                 if filename_match:
-                    actual_filename = filename_match.group(1).strip('"\'')
-                    actual_filename = unquote(actual_filename)
+                    actual_filename = unquote(filename_match.group(1).strip('"\''))
+                    # Server-supplied name: drop any directory part and sanitise like main() does
+                    actual_filename = _UNSAFE.sub('', os.path.basename(actual_filename.replace('\\', '/')))
             
             # If we got a better filename from headers, update filepath
-            if actual_filename and actual_filename.lower().endswith('.pdf'):
-                # Only update if current filename is generic
+            if actual_filename and len(actual_filename) > 4 and actual_filename.lower().endswith('.pdf'):
+                # Only update if current filename is generic or just the URL path basename fallback
                 current_basename = os.path.basename(filepath).lower()
-                if current_basename in ['visualizar.pdf', 'baixar.pdf', 'download.pdf', 'documento.pdf']:
+                url_basename = os.path.basename(urlparse(url).path).lower()
+                if (current_basename in _GENERIC_NAMES or
+                        (url_basename and not url_basename.endswith('.pdf') and current_basename == url_basename + '.pdf')):
                     # Update filepath with actual filename
                     dir_path = os.path.dirname(filepath)
                     filepath = os.path.join(dir_path, actual_filename)
@@ -566,12 +692,15 @@ def download_file(url: str, filepath: str, max_retries: int = 3) -> Tuple[bool,
             
             # Check if should overwrite
             if os.path.exists(filepath):
-                if not should_overwrite_file(filepath, total_size):
+                if not should_overwrite_file(filepath, total_size or None, overwrite):
                     logger.info(f"Skipping {filename}")
+                    response.close()  # body not read: release the connection
                     return (True, 'skipped')
+            overwrite = 'overwrite'  # decision taken: a retry must not ask again
             
-            # Download with progress bar
-            with open(filepath, 'wb') as f:
+            # Download with progress bar into a .part file, so an interrupted download is never taken as an existing file
+            part_path = filepath + '.part'
+            with open(part_path, 'wb') as f:
                 if total_size > 0:
                     with tqdm(
                         total=total_size,
@@ -581,7 +710,7 @@ def download_file(url: str, filepath: str, max_retries: int = 3) -> Tuple[bool,
                         desc=filename,
                         ncols=100
                     ) as pbar:
-                        for chunk in response.iter_content(chunk_size=8192):
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
                             if chunk:
                                 f.write(chunk)
                                 pbar.update(len(chunk))
@@ -594,14 +723,19 @@ def download_file(url: str, filepath: str, max_retries: int = 3) -> Tuple[bool,
                         desc=filename,
                         ncols=100
                     ) as pbar:
-                        for chunk in response.iter_content(chunk_size=8192):
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
                             if chunk:
                                 f.write(chunk)
                                 pbar.update(len(chunk))
+            os.replace(part_path, filepath)
             
             logger.info(f"Successfully downloaded: {filename}")
             return (True, 'downloaded')
             
+        except requests.HTTPError as e:
+            # Status errors were already retried by the adapter
+            logger.error(f"Failed to download {url}: {e}")
+            return (False, 'failed')
         except requests.RequestException as e:
             if attempt < max_retries - 1:
                 logger.warning(f"Attempt {attempt + 1} failed for {url}: {e}. Retrying...")
@@ -610,20 +744,49 @@ def download_file(url: str, filepath: str, max_retries: int = 3) -> Tuple[bool,
                 return (False, 'failed')
         except Exception as e:
             logger.error(f"Unexpected error downloading {url}: {e}")
-            if attempt < max_retries - 1:
-                logger.warning(f"Retrying...")
-            else:
-                return (False, 'failed')
-    
+            return (False, 'failed')
     return (False, 'failed')
 
 
+def parse_args() -> argparse.Namespace:
+    """
+    Parse command line arguments.
+    
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Download PDFs from the Diário Oficial do Estado do Ceará')
+    period = parser.add_mutually_exclusive_group()
+    period.add_argument('--year', type=int, metavar='YYYY', help='download every date of the year')
+    period.add_argument('--days', type=int, metavar='N', help='download the last N days')
+    parser.add_argument('--overwrite', choices=['skip', 'overwrite', 'ask', 'size'], default='skip',
+                        help='existing files: skip (before any request, default), overwrite, ask, '
+                             'or size (redownload only when the size differs from Content-Length)')
+    parser.add_argument('--skip-existing', action='store_const', const='skip', dest='overwrite',
+                        help='same as --overwrite skip')
+    parser.add_argument('--no-skip-existing', action='store_const', const='ask', dest='overwrite',
+                        help='same as --overwrite ask')
+    args = parser.parse_args()
+    
+    if args.year is not None and not 2000 <= args.year <= datetime.now().year:
+        parser.error(f"--year must be between 2000 and {datetime.now().year}")
+    if args.days is not None and args.days <= 0:
+        parser.error("--days must be a positive number")
+    return args
+
+
 def main():
     """Main execution function."""
+    args = parse_args()
     logger.info("Starting Diários Oficiais Ceará Scraper")
     
-    # Get user input
-    mode, value = get_user_input()
+    # Get period from the command line, or ask the user when none was given
+    if args.year is not None:
+        mode, value = 'year', args.year
+    elif args.days is not None:
+        mode, value = 'days', args.days
+    else:
+        mode, value = get_user_input()
     logger.info(f"Mode: {mode}, Value: {value}")
     
     # Generate dates
@@ -631,11 +794,17 @@ def main():
     logger.info(f"Generated {len(dates)} dates to process")
     
     # Extract unique years from dates
-    years = sorted(set(int(date[:4]) for date in dates))
+    years = sorted(set(int(date_str[:4]) for date_str in dates))
     
     # Setup directories
     setup_directories(BASE_DIR, years)
     
+    # Existing files per year, listed once so the skip check needs no disk access per link
+    existing = {
+        year: {entry.name for entry in os.scandir(os.path.join(BASE_DIR, str(year)))}
+        for year in years
+    } if args.overwrite == 'skip' else {}
+    
     # Statistics
     total_downloaded = 0
     total_skipped = 0
@@ -643,45 +812,53 @@ def main():
     dates_with_publications = 0
     dates_without_publications = 0
     
-    # Process each date
-    for date_str in dates:
-        year = int(date_str[:4])
-        logger.info(f"Processing date: {date_str}")
-        
-        # Try shortcut method first
-        links, shortcut_worked = extract_pdf_links_shortcut(date_str)
-        
-        # If shortcut failed to load page, try Selenium
-        # If shortcut worked but returned no links, it means no publications (don't try Selenium)
-        if not shortcut_worked:
-            logger.info(f"Shortcut method failed for {date_str}, trying Selenium fallback")
-            links = extract_pdf_links_selenium(year, date_str)
-        
-        if not links:
-            logger.info(f"No publications found for date {date_str}")
-            dates_without_publications += 1
-            continue
-        
-        dates_with_publications += 1
-        logger.info(f"Found {len(links)} files for date {date_str}")
-        
-        # Download each file
-        for filename, url in links:
-            # Clean filename (remove invalid characters)
-            safe_filename = "".join(c for c in filename if c.isalnum() or c in "._- ")
-            if not safe_filename.endswith('.pdf'):
-                safe_filename += '.pdf'
+    # Try shortcut method first, fetching all dates concurrently (network-bound)
+    logger.info(f"Fetching shortcut pages with {MAX_WORKERS} workers")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        shortcut_results = list(executor.map(extract_pdf_links_shortcut, dates))
+    
+    # Process each date (the Selenium driver is only launched if a shortcut fails, then reused)
+    with SeleniumFallback() as selenium_fallback:
+        for date_str, (links, shortcut_worked) in zip(dates, shortcut_results):
+            year = int(date_str[:4])
+            logger.info(f"Processing date: {date_str}")
             
-            filepath = os.path.join(BASE_DIR, str(year), safe_filename)
+            # If shortcut failed to load page, try Selenium
+            # If shortcut worked but returned no links, it means no publications (don't try Selenium)
+            if not shortcut_worked:
+                logger.info(f"Shortcut method failed for {date_str}, trying Selenium fallback")
+                links = selenium_fallback.fetch(year, date_str)
             
-            success, status = download_file(url, filepath)
-            if status == 'downloaded':
-                total_downloaded += 1
-            elif status == 'skipped':
-                total_skipped += 1
-            elif status == 'failed':
-                total_failed += 1
-    
+            if not links:
+                logger.info(f"No publications found for date {date_str}")
+                dates_without_publications += 1
+                continue
+            
+            dates_with_publications += 1
+            logger.info(f"Found {len(links)} files for date {date_str}")
+            
+            # Download each file
+            for filename, url in links:
+                # Clean filename (remove invalid characters)
+                safe_filename = _UNSAFE.sub('', filename)
+                if not safe_filename.endswith('.pdf'):
+                    safe_filename += '.pdf'
+                
+                if safe_filename in existing.get(year, ()):
+                    logger.info(f"Skipping existing {safe_filename}")
+                    total_skipped += 1
+                    continue
+                
+                filepath = os.path.join(BASE_DIR, str(year), safe_filename)
+                
+                success, status = download_file(url, filepath, args.overwrite)
+                if status == 'downloaded':
+                    total_downloaded += 1
+                elif status == 'skipped':
+                    total_skipped += 1
+                elif status == 'failed':
+                    total_failed += 1
+        
     # Print summary
     print("\n" + "="*60)
     print("DOWNLOAD SUMMARY")
@@ -4,17 +4,44 @@ Download de arquivos de dados eleitorais do TSE
 Portal de Dados Abertos do TSE: https://dadosabertos.tse.jus.br/dataset/?groups=candidatos
 """
 
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+import aiohttp
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+import argparse
+import contextlib
+import json
 import os
+import random
+import re
+import shutil
 import sys
+import threading
 import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 from tqdm import tqdm
 
 BASE_URL = 'https://dadosabertos.tse.jus.br'
 CANDIDATOS_URL = f'{BASE_URL}/dataset/?groups=candidatos'
 PASTA_BASE = 'dados-tse'
+RESOURCES_CACHE = '_resources_{dataset}.json'  # lista de recursos de cada dataset, salva na pasta do ano
+MAX_WORKERS_SCRAPE = 8
+MAX_WORKERS_RESOLVE = 8  # páginas de recurso, pool único compartilhado por todos os anos
+MAX_DOWNLOADS = 8
+CHUNK_SIZE = 1 << 20  # 1 MiB por bloco lido/escrito
+PROGRESS_STEP = 8 * CHUNK_SIZE  # atualiza a barra de progresso a cada 8 MiB
+PARALLEL_PARTS = 4  # conexões por arquivo grande
+PARALLEL_MIN_SIZE = 64 << 20  # abaixo de 64 MiB baixa em fluxo único
+MAX_RETRY_AFTER = 600  # espera máxima (s) aceita de um Retry-After
+
+# Extensões que indicam link direto de download e o formato correspondente
+_EXT_MAP = {'.zip': 'ZIP', '.csv': 'CSV', '.pdf': 'PDF', '.txt': 'TXT',
+            '.xlsx': 'XLSX', '.xls': 'XLSX', '.jpg': 'JPEG', '.jpeg': 'JPEG'}
+DIRECT_EXTS = tuple(_EXT_MAP)
 
 # Headers para evitar bloqueio
 HEADERS = {
@@ -22,21 +49,88 @@ HEADERS = {
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
 }
 
+# Sessão compartilhada: reaproveita conexões keep-alive com dadosabertos e cdn do TSE
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+# Cabe as threads de anos mais as de páginas de recurso, sem descartar conexões ("Connection pool is full")
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS_SCRAPE + MAX_WORKERS_RESOLVE, max_retries=0)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Executor limitado e compartilhado para resolver páginas de recurso (evita pools aninhados por ano)
+_RESOLVE_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS_RESOLVE)
+
+# Expressões regulares pré-compiladas
+_YEAR_RE = re.compile(r'\b(19|20)\d{2}\b')
+_SAFE1 = re.compile(r'[^\w\s-]')
+_SAFE2 = re.compile(r'[-\s]+')
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# Tamanhos remotos já consultados por _remote_size: {url: bytes ou None}
+_REMOTE_SIZES = {}
+
+# Linhas do terminal ocupadas pelas barras de progresso abertas (ver progress_bar)
+_BAR_POSITIONS = set()
+
+# Seletores CSS para as páginas do portal (CKAN)
+YEAR_LINKS = 'a[href*="dataset"]'
+RES_ITEMS = 'li[class*="resource" i]'
+RES_TITLE = 'h3[class*="heading" i], h4[class*="heading" i], a[class*="heading" i]'
+RES_LINKS = 'a[href]'
+SIZE_UNITS = ('mb', 'kb', 'gb')
+
+# Downloads grandes: sem limite total, apenas para conexão e leitura de cada bloco
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=60)
+
 
 def setup_directories(base_dir=PASTA_BASE, year=None):
     """Cria diretórios necessários"""
-    if not os.path.isdir(base_dir):
-        os.makedirs(base_dir)
+    os.makedirs(base_dir, exist_ok=True)
     
     if year:
         year_dir = os.path.join(base_dir, str(year))
-        if not os.path.isdir(year_dir):
-            os.makedirs(year_dir)
+        os.makedirs(year_dir, exist_ok=True)
         return year_dir
     return base_dir
 
 
-def get_election_years(base_url=BASE_URL):
+def parse_html(response):
+    """
+    Faz o parsing do HTML com o lexbor (selectolax), que lê bytes sempre como UTF-8
+    Decodifica pelo charset do cabeçalho HTTP, senão pelo <meta charset>, senão UTF-8 com fallback cp1252
+    (mesma regra de decode_page em doe/diarios_ceara_scraper.py)
+    """
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return LexborHTMLParser(response.text)
+    content = response.content
+    meta = _META_CHARSET.search(content[:2048])
+    if meta:
+        try:
+            return LexborHTMLParser(content.decode(meta.group(1).decode('ascii'), errors='replace'))
+        except LookupError:
+            pass  # charset desconhecido
+    try:
+        return LexborHTMLParser(content.decode('utf-8'))
+    except UnicodeDecodeError:
+        return LexborHTMLParser(content.decode('cp1252', errors='replace'))
+
+
+def _href(node):
+    """Retorna o href de um nó (string vazia se ausente)"""
+    return node.attributes.get('href') or ''
+
+
+def _size_text(node):
+    """Retorna o primeiro texto dentro do nó que menciona tamanho (MB/KB/GB)"""
+    for child in node.traverse(include_text=True):
+        if child.tag == '-text':
+            text = child.text(deep=False)
+            if any(unit in text.lower() for unit in SIZE_UNITS):
+                return text.strip()
+    return None
+
+
+def get_election_years(base_url=BASE_URL, session=SESSION):
     """
     Extrai todos os anos de eleição disponíveis da página principal
     Retorna lista de tuplas: [(ano, url), ...] ordenada por ano (mais recente primeiro)
@@ -44,36 +138,40 @@ def get_election_years(base_url=BASE_URL):
     print(time.asctime(), 'Buscando anos de eleição disponíveis...')
     
     try:
-        response = requests.get(CANDIDATOS_URL, headers=HEADERS, timeout=30)
+        response = session.get(CANDIDATOS_URL, timeout=30)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+        doc = parse_html(response)
         
         years_data = []
+        seen = set()
         
         # Encontrar todos os links que contêm "Candidatos -" seguido de um ano
-        all_links = soup.find_all('a', href=True)
-        for link in all_links:
-            text = link.get_text(strip=True)
-            href = link.get('href', '')
+        for link in doc.css(YEAR_LINKS):
+            text = link.text(strip=True)
+            href = _href(link)
+            
+            # Procurar padrão "Candidatos - YYYY" (ano extraído pelo regex)
+            if 'Candidatos' not in text:
+                continue
+            year_match = _YEAR_RE.search(text)
+            if not year_match:
+                continue
+            year = int(year_match.group())
+            
+            # Construir URL completa
+            if href.startswith('/'):
+                full_url = urljoin(base_url, href)
+            elif href.startswith('http'):
+                full_url = href
+            else:
+                continue
             
-            # Procurar padrão "Candidatos - YYYY"
-            if 'Candidatos' in text and any(c.isdigit() for c in text):
-                # Extrair o ano (últimos 4 dígitos no texto)
-                import re
-                year_match = re.search(r'\b(19|20)\d{2}\b', text)
-                if year_match:
-                    year = int(year_match.group())
-                    # Construir URL completa
-                    if href.startswith('/'):
-                        full_url = urljoin(base_url, href)
-                    elif href.startswith('http'):
-                        full_url = href
-                    else:
-                        continue
-                    
-                    # Evitar duplicatas
-                    if (year, full_url) not in years_data:
-                        years_data.append((year, full_url))
+            # Evitar duplicatas
+            key = (year, full_url)
+            if key in seen:
+                continue
+            seen.add(key)
+            years_data.append(key)
         
         # Ordenar por ano (mais recente primeiro)
         years_data.sort(key=lambda x: x[0], reverse=True)
@@ -86,116 +184,155 @@ def get_election_years(base_url=BASE_URL):
         sys.exit(1)
 
 
-def get_resources_from_year(year_url, year):
+def _resolve_direct(download_url, session=SESSION):
+    """
+    Segue o link para a página do recurso e procura o link de download direto
+    Retorna a URL direta ou a URL original se não encontrar/falhar
+    """
+    resource_page_url = urljoin(BASE_URL, download_url)
+    try:
+        res_response = session.get(resource_page_url, timeout=30)
+        res_response.raise_for_status()
+        res_doc = parse_html(res_response)
+        # Procurar link de download direto na página do recurso
+        direct_download = next((
+            href for href in map(_href, res_doc.css(RES_LINKS))
+            if href.endswith(DIRECT_EXTS) or 'download' in href.lower() or 'cdn.tse.jus.br' in href
+        ), None)
+        if direct_download:
+            if direct_download.startswith('/'):
+                direct_download = urljoin(BASE_URL, direct_download)
+            return direct_download
+    except:
+        pass  # Se falhar, usar a URL original
+    return download_url
+
+
+def _dataset_slug(year_url):
+    """Retorna um identificador do dataset seguro para nome de arquivo (último trecho do caminho da URL)"""
+    dataset = os.path.basename(urlparse(year_url).path.rstrip('/'))
+    return _SAFE2.sub('-', _SAFE1.sub('', dataset)).strip('-') or 'dataset'
+
+
+def _resources_cache_path(year_url, year):
+    """
+    Retorna o caminho da lista de recursos salva de um dataset:
+    dados-tse/<ano>/_resources_<dataset>.json (um ano pode ter mais de um dataset)
+    """
+    return os.path.join(PASTA_BASE, str(year), RESOURCES_CACHE.format(dataset=_dataset_slug(year_url)))
+
+
+def get_resources_from_year(year_url, year, session=SESSION, force_refresh=False):
     """
     Extrai todos os recursos (arquivos) de uma página de ano específico
+    Usa a lista salva em dados-tse/<ano>/_resources_<dataset>.json, salvo se force_refresh
+    Uma lista salva ilegível (ex.: gravação interrompida) é ignorada e buscada de novo
     Retorna lista de dicionários: [{'name': '...', 'url': '...', 'format': '...', 'size': '...'}, ...]
     """
+    cache = _resources_cache_path(year_url, year)
+    if not force_refresh and os.path.exists(cache):
+        try:
+            with open(cache, encoding='utf-8') as f:
+                resources = json.load(f)
+            print(f'  {len(resources)} recursos de {year} lidos de {cache}')
+            return resources
+        except (OSError, ValueError) as e:
+            print(f'  Aviso: lista salva {cache} ilegível ({e}), buscando novamente')
+    
     try:
-        response = requests.get(year_url, headers=HEADERS, timeout=30)
+        response = session.get(year_url, timeout=30)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+        doc = parse_html(response)
         
         resources = []
         
         # Encontrar a seção "Dados e recursos"
-        dados_section = soup.find('h2', string=lambda x: x and 'dados' in x.lower() and 'recursos' in x.lower())
+        dados_section = any(
+            'dados' in h2.text().lower() and 'recursos' in h2.text().lower()
+            for h2 in doc.css('h2')
+        )
         
         if not dados_section:
             print(f'  Aviso: Seção "Dados e recursos" não encontrada para {year}')
             return resources
         
         # Encontrar todos os itens de recurso
-        resource_items = soup.find_all('li', class_=lambda x: x and 'resource' in str(x).lower())
+        resource_items = doc.css(RES_ITEMS)
         
         print(f'  Encontrados {len(resource_items)} recursos para {year}')
         
+        # Primeira passada: título, link e tamanho de cada recurso
+        found = []
         for res_item in resource_items:
             try:
                 # Obter título do recurso
-                title_elem = res_item.find(['h3', 'h4', 'a'], class_=lambda x: x and 'heading' in str(x).lower())
-                if not title_elem:
-                    title_elem = res_item.find('a', href=True)
+                title_elem = res_item.css_first(RES_TITLE) or res_item.css_first(RES_LINKS)
                 
-                if not title_elem:
+                if title_elem is None:
                     continue
                 
-                title = title_elem.get_text(strip=True)
+                title = title_elem.text(strip=True)
                 
                 # Encontrar link "Ir para recurso" que contém a URL de download
-                ir_recurso_link = res_item.find('a', string=lambda x: x and 'ir para recurso' in x.lower())
+                ir_recurso_link = next((
+                    link for link in res_item.css('a')
+                    if 'ir para recurso' in link.text(strip=True).lower()
+                ), None)
                 
-                if not ir_recurso_link:
+                if ir_recurso_link is None:
                     # Tentar encontrar qualquer link que pareça ser de download
-                    download_links = res_item.find_all('a', href=True)
-                    for link in download_links:
-                        href = link.get('href', '')
+                    for link in res_item.css(RES_LINKS):
+                        href = _href(link)
                         # Verificar se é uma URL externa (provavelmente download)
                         if href.startswith('http') and ('cdn.tse.jus.br' in href or 'download' in href.lower()):
                             ir_recurso_link = link
                             break
                 
-                if not ir_recurso_link:
+                if ir_recurso_link is None:
                     print(f'    Aviso: Link de download não encontrado para "{title[:50]}"')
                     continue
                 
-                download_url = ir_recurso_link.get('href', '')
+                download_url = _href(ir_recurso_link)
+                
+                # Tentar obter tamanho do arquivo (se disponível)
+                file_size = _size_text(res_item)
                 
-                # Se a URL não parece ser um link direto de download, seguir para a página do recurso
-                if download_url and not download_url.endswith(('.zip', '.csv', '.pdf', '.txt', '.xlsx', '.xls', '.jpg', '.jpeg')):
-                    # Pode ser um link para a página do recurso, tentar seguir
-                    if download_url.startswith('/') or 'dataset' in download_url:
-                        resource_page_url = urljoin(BASE_URL, download_url)
-                        try:
-                            res_response = requests.get(resource_page_url, headers=HEADERS, timeout=30)
-                            res_response.raise_for_status()
-                            res_soup = BeautifulSoup(res_response.text, 'lxml')
-                            # Procurar link de download direto na página do recurso
-                            direct_download = res_soup.find('a', href=lambda x: x and (
-                                x.endswith(('.zip', '.csv', '.pdf', '.txt', '.xlsx', '.xls', '.jpg', '.jpeg')) or
-                                'download' in x.lower() or 'cdn.tse.jus.br' in x
-                            ))
-                            if direct_download:
-                                download_url = direct_download.get('href', '')
-                                if download_url.startswith('/'):
-                                    download_url = urljoin(BASE_URL, download_url)
-                        except:
-                            pass  # Se falhar, usar a URL original
+                found.append([title, download_url, file_size])
                 
+            except Exception as e:
+                print(f'    Erro ao processar recurso: {e}')
+                continue
+        
+        # Se a URL não parece ser um link direto de download, seguir para a página do recurso
+        # (páginas de recurso buscadas em paralelo no executor compartilhado entre os anos)
+        indirect = [
+            item for item in found
+            if item[1] and not item[1].endswith(DIRECT_EXTS)
+            and (item[1].startswith('/') or 'dataset' in item[1])
+        ]
+        unresolved = 0
+        if indirect:
+            resolved = list(_RESOLVE_EXECUTOR.map(lambda item: _resolve_direct(item[1], session), indirect))
+            for item, direct_url in zip(indirect, resolved):
+                # _resolve_direct devolve a URL original quando falha
+                if direct_url == item[1] or direct_url.startswith('/'):
+                    unresolved += 1
+                item[1] = direct_url
+        
+        for title, download_url, file_size in found:
+            try:
                 # Limpar URL (remover trailing dots, espaços, etc)
                 download_url = download_url.rstrip('. \n\r\t')
                 
-                # Extrair formato do arquivo (se disponível no título ou URL)
-                file_format = 'unknown'
-                if download_url:
-                    parsed = urlparse(download_url)
-                    path = parsed.path.lower()
-                    if path.endswith('.zip'):
-                        file_format = 'ZIP'
-                    elif path.endswith('.csv'):
-                        file_format = 'CSV'
-                    elif path.endswith('.pdf'):
-                        file_format = 'PDF'
-                    elif path.endswith('.txt'):
-                        file_format = 'TXT'
-                    elif path.endswith(('.xlsx', '.xls')):
-                        file_format = 'XLSX'
-                    elif path.endswith(('.jpg', '.jpeg')):
-                        file_format = 'JPEG'
-                
-                # Tentar obter tamanho do arquivo (se disponível)
-                file_size = None
-                size_elem = res_item.find(string=lambda x: x and ('mb' in x.lower() or 'kb' in x.lower() or 'gb' in x.lower()))
-                if size_elem:
-                    file_size = size_elem.strip()
+                # Extrair nome e formato do arquivo a partir da URL
+                filename = os.path.basename(urlparse(download_url).path)
+                file_format = _EXT_MAP.get(os.path.splitext(filename)[1].lower(), 'unknown')
                 
                 # Gerar nome do arquivo
-                filename = os.path.basename(urlparse(download_url).path)
-                if not filename or filename == '/':
+                if not filename:
                     # Usar título como base para o nome do arquivo
-                    import re
-                    safe_title = re.sub(r'[^\w\s-]', '', title).strip()
-                    safe_title = re.sub(r'[-\s]+', '-', safe_title)
+                    safe_title = _SAFE1.sub('', title).strip()
+                    safe_title = _SAFE2.sub('-', safe_title)
                     filename = f"{safe_title}.{file_format.lower()}"
                 
                 resources.append({
@@ -210,6 +347,17 @@ def get_resources_from_year(year_url, year):
                 print(f'    Erro ao processar recurso: {e}')
                 continue
         
+        if unresolved:
+            # Não salvar a lista: uma falha momentânea ficaria gravada para anos já encerrados
+            print(f'    Aviso: {unresolved} link(s) não resolvido(s) para {year}; lista não salva em cache')
+        elif resources:
+            # Gravar em arquivo temporário e trocar de uma vez: nunca deixa uma lista truncada
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            tmp_cache = f'{cache}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_cache, 'w', encoding='utf-8') as f:
+                json.dump(resources, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_cache, cache)
+        
         return resources
         
     except requests.RequestException as e:
@@ -217,57 +365,331 @@ def get_resources_from_year(year_url, year):
         return []
 
 
-def download_file(url, output_path, show_progress=True):
+@contextlib.contextmanager
+def progress_bar(**kwargs):
+    """
+    Barra tqdm em uma linha própria do terminal (position), liberada ao terminar
+    Evita que as barras dos downloads simultâneos se sobreponham; mensagens usam tqdm.write
     """
-    Baixa um arquivo com barra de progresso
+    position = 0
+    while position in _BAR_POSITIONS:
+        position += 1
+    _BAR_POSITIONS.add(position)
+    try:
+        with tqdm(position=position, leave=False, **kwargs) as pbar:
+            yield pbar
+    finally:
+        _BAR_POSITIONS.discard(position)
+
+
+class RateLimited(Exception):
+    """Servidor respondeu 429/503; retry_after em segundos (None se não informado)"""
+    
+    def __init__(self, retry_after, message=''):
+        super().__init__(message or 'Limite de requisições')
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers, max_wait=MAX_RETRY_AFTER):
+    """
+    Lê o cabeçalho Retry-After (segundos ou data HTTP)
+    Retorna segundos de espera limitados a max_wait, ou None se ausente/inválido
+    """
+    value = (headers or {}).get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(int(value), max_wait)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return min(max(0.0, (when - datetime.now(timezone.utc)).total_seconds()), max_wait)
+
+
+class _RangeNotSupported(Exception):
+    """Servidor ignorou o cabeçalho Range durante o download em partes"""
+
+
+def _write_all(fd, data):
+    """os.write até gravar todo o bloco (a chamada pode gravar menos bytes que o pedido)"""
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        if not written:
+            raise OSError(f'os.write não gravou nenhum byte ({len(view)} pendentes)')
+        view = view[written:]
+
+
+def _pwrite_all(fd, data, offset):
+    """os.pwrite até gravar todo o bloco a partir de offset, avançando a posição a cada gravação parcial"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        if not written:
+            raise OSError(f'os.pwrite não gravou nenhum byte ({len(view)} pendentes em {offset})')
+        view = view[written:]
+        offset += written
+
+
+def _load_parts_state(state_path, url, size, ranges):
+    """
+    Lê o progresso salvo de um download em partes interrompido
+    Retorna a lista de bytes já gravados por parte, ou None se não houver estado compatível
+    """
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state['url'] == url and state['size'] == size and [tuple(r) for r in state['ranges']] == ranges:
+            return [int(n) for n in state['done']]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _save_parts_state(state_path, url, size, ranges, done):
+    """Grava (de forma atômica) os bytes já baixados de cada parte, para retomar depois"""
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'size': size, 'ranges': ranges, 'done': done}, f)
+    os.replace(tmp_path, state_path)
+
+
+async def parallel_download(session, url, output_path, sem, parts=PARALLEL_PARTS, show_progress=True):
+    """
+    Baixa um arquivo grande em partes (byte ranges) concorrentes, gravando cada
+    parte na sua posição com os.pwrite em um arquivo .part pré-alocado
+    Se falhar, o progresso de cada parte fica em <arquivo>.part.json e a próxima
+    tentativa (ou execução) continua cada parte de onde parou
+    Retorna (success, error_message) ou None se o servidor não aceitar Range
+    """
+    async with sem:
+        async with session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT) as head:
+            if head.status != 200 or head.headers.get('Accept-Ranges', '').lower() != 'bytes':
+                return None
+            size = head.content_length
+    
+    if not size or size < PARALLEL_MIN_SIZE:
+        return None
+    
+    step = -(-size // parts)
+    ranges = [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+    part_path = output_path + '.part'
+    state_path = part_path + '.json'
+    filename = os.path.basename(output_path)
+    
+    # Continuar um .part anterior só se o progresso salvo corresponder ao mesmo arquivo remoto
+    done = _load_parts_state(state_path, url, size, ranges) if os.path.exists(part_path) else None
+    if done is None:
+        done = [0] * len(ranges)
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    else:
+        fd = os.open(part_path, os.O_WRONLY, 0o644)
+    try:
+        os.ftruncate(fd, size)
+        with progress_bar(total=size, unit='B', unit_scale=True, unit_divisor=1024,
+                          desc=filename[:50], initial=sum(done), disable=not show_progress) as pbar:
+            
+            async def fetch_range(i, start, end):
+                if start + done[i] > end:
+                    return
+                async with sem:
+                    async with session.get(url, headers={'Range': f'bytes={start + done[i]}-{end}'},
+                                           timeout=DOWNLOAD_TIMEOUT) as response:
+                        response.raise_for_status()
+                        if response.status != 206:
+                            raise _RangeNotSupported()
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await asyncio.to_thread(_pwrite_all, fd, chunk, start + done[i])
+                            done[i] += len(chunk)
+                            pbar.update(len(chunk))
+            
+            tasks = [asyncio.ensure_future(fetch_range(i, start, end)) for i, (start, end) in enumerate(ranges)]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException as e:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if not isinstance(e, _RangeNotSupported):
+                    _save_parts_state(state_path, url, size, ranges, done)
+                raise
+    except _RangeNotSupported:
+        os.close(fd)
+        fd = None
+        os.remove(part_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return None
+    finally:
+        if fd is not None:
+            os.close(fd)
+    
+    os.replace(part_path, output_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return (True, None)
+
+
+async def download_file_async(session, url, output_path, sem, show_progress=True, resume=True):
+    """
+    Baixa um arquivo com barra de progresso usando aiohttp
+    Com resume=True um arquivo parcial existente é continuado via Range;
+    com resume=False ele é descartado e o download começa do zero
+    Arquivos grandes novos são baixados em partes quando o servidor aceita Range
     Retorna (success, error_message)
     """
     try:
-        # Verificar se arquivo parcial existe para retomar download
-        resume_header = {}
-        if os.path.exists(output_path):
-            resume_header['Range'] = f'bytes={os.path.getsize(output_path)}-'
+        if not resume:
+            # Descartar também o progresso de um download em partes anterior
+            for path in (output_path, output_path + '.part', output_path + '.part.json'):
+                if os.path.exists(path):
+                    os.remove(path)
         
-        response = requests.get(url, headers={**HEADERS, **resume_header}, stream=True, timeout=60)
+        # os.pwrite não existe no Windows: lá sempre baixa em fluxo único
+        if not os.path.exists(output_path) and hasattr(os, 'pwrite'):
+            result = await parallel_download(session, url, output_path, sem, show_progress=show_progress)
+            if result is not None:
+                return result
         
-        # Se servidor não suporta Range, começar do zero
-        if response.status_code == 416:  # Range Not Satisfiable
+        async with sem:
+            # Verificar se arquivo parcial existe para retomar download
             resume_header = {}
-            response = requests.get(url, headers=HEADERS, stream=True, timeout=60)
-        
-        response.raise_for_status()
-        
-        # Obter tamanho total
-        total_size = int(response.headers.get('content-length', 0))
-        if resume_header and os.path.exists(output_path):
-            total_size += os.path.getsize(output_path)
-        
-        # Modo de escrita
-        mode = 'ab' if resume_header and os.path.exists(output_path) else 'wb'
-        
-        filename = os.path.basename(output_path)
-        
-        with open(output_path, mode) as f:
-            if show_progress:
-                with tqdm(total=total_size, unit='B', unit_scale=True, unit_divisor=1024, 
-                          desc=filename[:50], initial=os.path.getsize(output_path) if mode == 'ab' else 0) as pbar:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            pbar.update(len(chunk))
-            else:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            if os.path.exists(output_path):
+                resume_header['Range'] = f'bytes={os.path.getsize(output_path)}-'
+            
+            response = await session.get(url, headers=resume_header, timeout=DOWNLOAD_TIMEOUT)
+            
+            # Se servidor não suporta Range, começar do zero
+            if response.status == 416:  # Range Not Satisfiable
+                response.release()
+                resume_header = {}
+                response = await session.get(url, timeout=DOWNLOAD_TIMEOUT)
+            
+            async with response:
+                response.raise_for_status()
+                
+                # Modo de escrita (servidor pode ignorar o Range e devolver o arquivo inteiro)
+                mode = 'ab' if resume_header and response.status == 206 else 'wb'
+                initial = os.path.getsize(output_path) if mode == 'ab' else 0
+                
+                # Obter tamanho total
+                total_size = (response.content_length or 0) + initial
+                
+                filename = os.path.basename(output_path)
+                
+                # Escrita direta no descritor, fora do event loop
+                flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+                flags |= os.O_APPEND if mode == 'ab' else os.O_TRUNC
+                fd = os.open(output_path, flags, 0o644)
+                try:
+                    with progress_bar(total=total_size, unit='B', unit_scale=True, unit_divisor=1024,
+                                      desc=filename[:50], initial=initial, disable=not show_progress) as pbar:
+                        pending = 0
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            await asyncio.to_thread(_write_all, fd, chunk)
+                            pending += len(chunk)
+                            if pending >= PROGRESS_STEP:
+                                pbar.update(pending)
+                                pending = 0
+                        pbar.update(pending)
+                finally:
+                    os.close(fd)
         
         return (True, None)
         
-    except requests.RequestException as e:
+    except aiohttp.ClientResponseError as e:
+        if e.status in (429, 503):
+            return (False, RateLimited(parse_retry_after(e.headers), str(e)))
         return (False, str(e))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return (False, str(e) or type(e).__name__)
     except Exception as e:
         return (False, str(e))
 
 
+async def download_with_retry(session, resource, output_path, sem, resume=True, max_retries=8, max_deferrals=20):
+    """
+    Baixa um recurso tentando novamente com backoff exponencial e jitter
+    Respostas 429/503 aguardam o Retry-After do servidor e não contam como tentativa
+    Retorna (success, error_message)
+    """
+    attempt = 1
+    deferrals = 0
+    while True:
+        success, error = await download_file_async(session, resource['url'], output_path, sem, resume=resume)
+        resume = True  # novas tentativas continuam o que já foi gravado
+        
+        if success:
+            tqdm.write(f'    ✓ Baixado: {resource["name"]}')
+            return (True, None)
+        
+        if isinstance(error, RateLimited) and deferrals < max_deferrals:
+            deferrals += 1
+            if error.retry_after is not None:
+                delay = error.retry_after
+            else:
+                delay = min(60, 2 ** deferrals + random.uniform(0, 1))
+            tqdm.write(f'    ⏳ Servidor limitou requisições para {resource["name"]} - aguardando {delay:.0f}s...')
+        elif attempt < max_retries:
+            attempt += 1
+            delay = min(60, 2 ** attempt + random.uniform(0, 1))  # Backoff exponencial com jitter
+            tqdm.write(f'    ✗ Erro em {resource["name"]}: {error} - Tentativa {attempt}/{max_retries} em {delay:.0f}s...')
+        else:
+            tqdm.write(f'    ✗ Falha após {max_retries} tentativas em {resource["name"]}: {error}')
+            return (False, str(error))
+        
+        await asyncio.sleep(delay)
+
+
+async def _download_all(tasks):
+    """
+    Baixa todos os arquivos do plano concorrentemente
+    tasks: lista de (ano, recurso, caminho_saida, retomar)
+    Retorna lista de (success, error_message) na mesma ordem de tasks
+    """
+    sem = asyncio.Semaphore(MAX_DOWNLOADS)
+    connector = aiohttp.TCPConnector(limit=16, limit_per_host=8, ttl_dns_cache=300, enable_cleanup_closed=True)
+    async with aiohttp.ClientSession(headers=HEADERS, connector=connector) as session:
+        return await asyncio.gather(*(
+            download_with_retry(session, resource, output_path, sem, resume=resume)
+            for year, resource, output_path, resume in tasks
+        ))
+
+
+def link_or_copy(source_path, output_path):
+    """
+    Cria output_path como hardlink de source_path, sem novo download
+    Se não for possível (outro disco/sistema de arquivos), copia o arquivo
+    Não faz nada se os dois caminhos forem o mesmo arquivo
+    """
+    if os.path.abspath(source_path) == os.path.abspath(output_path):
+        return
+    if os.path.exists(output_path):
+        if os.path.exists(source_path) and os.path.samefile(source_path, output_path):
+            return
+        os.remove(output_path)
+    try:
+        os.link(source_path, output_path)
+    except OSError:
+        shutil.copyfile(source_path, output_path)
+
+
+def scrape_year(year, year_url, session=SESSION, refresh=False):
+    """
+    Cria o diretório do ano e obtém seus recursos
+    O ano corrente (eleição em aberto) é sempre buscado novamente no portal
+    Retorna (ano, url, recursos) para uso com executor.map
+    """
+    setup_directories(year=year)
+    force_refresh = refresh or year >= time.localtime().tm_year
+    resources = get_resources_from_year(year_url, year, session=session, force_refresh=force_refresh)
+    return (year, year_url, resources)
+
+
 def prompt_year_selection(available_years):
     """
     Solicita ao usuário seleção de anos
@@ -317,14 +739,62 @@ def prompt_year_selection(available_years):
             continue
 
 
-def handle_existing_file(filepath, global_skip_all=False, global_overwrite_all=False):
+def _remote_size(url, session=SESSION):
+    """
+    Obtém o tamanho do arquivo remoto (Content-Length) com um HEAD
+    Resultado guardado em _REMOTE_SIZES; retorna None se desconhecido
+    """
+    if url not in _REMOTE_SIZES:
+        size = None
+        try:
+            response = session.head(url, allow_redirects=True, timeout=30)
+            if response.ok and response.headers.get('Content-Length', '').isdigit():
+                size = int(response.headers['Content-Length'])
+        except requests.RequestException:
+            pass
+        _REMOTE_SIZES[url] = size
+    return _REMOTE_SIZES[url]
+
+
+def _local_size(filepath):
+    """Tamanho do arquivo local com um único stat; None se não existir"""
+    try:
+        return os.stat(filepath).st_size
+    except FileNotFoundError:
+        return None
+
+
+def _automatic_action(file_size, url=None):
+    """
+    Decide sem perguntar ao usuário, quando possível, o que fazer com o arquivo
+    file_size é o tamanho local (None se o arquivo não existe)
+    Retorna 'overwrite' (não existe), 'skip' (mesmo tamanho do servidor),
+    'resume' (menor que no servidor) ou None se for preciso perguntar
+    """
+    if file_size is None:
+        return 'overwrite'
+    
+    remote_size = _remote_size(url) if url else None
+    if remote_size is not None:
+        if file_size == remote_size:
+            return 'skip'
+        if file_size < remote_size:
+            return 'resume'
+    return None
+
+
+def handle_existing_file(filepath, global_skip_all=False, global_overwrite_all=False, url=None):
     """
     Lida com arquivos existentes
+    Se url for informada, compara o tamanho local com o do servidor:
+    igual -> pula sem perguntar; menor (download interrompido) -> retoma
     Retorna (action, updated_global_skip, updated_global_overwrite)
-    action pode ser 'skip' ou 'overwrite'
+    action pode ser 'skip', 'overwrite' ou 'resume'
     """
-    if not os.path.exists(filepath):
-        return ('overwrite', global_skip_all, global_overwrite_all)
+    file_size = _local_size(filepath)
+    action = _automatic_action(file_size, url)
+    if action:
+        return (action, global_skip_all, global_overwrite_all)
     
     if global_skip_all:
         return ('skip', global_skip_all, global_overwrite_all)
@@ -334,7 +804,6 @@ def handle_existing_file(filepath, global_skip_all=False, global_overwrite_all=F
     
     # Solicitar ao usuário
     filename = os.path.basename(filepath)
-    file_size = os.path.getsize(filepath)
     size_mb = file_size / (1024 * 1024)
     
     while True:
@@ -357,8 +826,109 @@ def handle_existing_file(filepath, global_skip_all=False, global_overwrite_all=F
             print('Opção inválida. Use s, o, sa ou oa.')
 
 
+def plan_downloads(scraped_years):
+    """
+    Monta o plano de downloads de todos os anos antes de iniciar qualquer download
+    scraped_years: [(ano, url_do_dataset, recursos), ...] como retornado por scrape_year
+    (um ano pode ter mais de um dataset; cada um entra com seus próprios recursos)
+    Arquivos existentes que não conferem com o servidor são decididos em uma
+    única pergunta (pular todos / sobrescrever todos / um a um)
+    Arquivos com a mesma URL em vários anos são baixados uma vez e vinculados
+    Retorna (to_download, to_skip, to_link):
+      to_download: [(ano, recurso, caminho, retomar), ...]
+      to_skip: [(ano, recurso, caminho), ...]
+      to_link: [(ano, recurso, caminho, caminho_origem), ...]
+    """
+    entries = []
+    claimed_paths = {}  # {caminho: url}, para nomes iguais de URLs diferentes no mesmo ano
+    for year, year_url, resources in scraped_years:
+        for resource in resources:
+            output_path = os.path.join(PASTA_BASE, str(year), resource['name'])
+            if claimed_paths.setdefault(output_path, resource['url']) != resource['url']:
+                # Outro dataset do ano já usa esse nome: acrescentar o identificador do dataset
+                base, ext = os.path.splitext(resource['name'])
+                resource = dict(resource, name=f'{base}_{_dataset_slug(year_url)}{ext}')
+                output_path = os.path.join(PASTA_BASE, str(year), resource['name'])
+                claimed_paths.setdefault(output_path, resource['url'])
+            entries.append((year, resource, output_path, _local_size(output_path)))
+    
+    # Consultar em paralelo o tamanho no servidor dos arquivos que já existem
+    existing_urls = {resource['url'] for year, resource, output_path, file_size in entries if file_size is not None}
+    if existing_urls:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS_SCRAPE) as executor:
+            list(executor.map(_remote_size, existing_urls))
+    
+    ambiguous = [output_path for year, resource, output_path, file_size in entries
+                 if _automatic_action(file_size, resource['url']) is None]
+    
+    global_skip_all = False
+    global_overwrite_all = False
+    while ambiguous:
+        print(f'\n{len(ambiguous)} arquivo(s) já existem e não conferem com o servidor:')
+        for output_path in ambiguous[:20]:
+            print(f'  {output_path}')
+        if len(ambiguous) > 20:
+            print(f'  ... e mais {len(ambiguous) - 20}')
+        choice = input('  [s] Pular todos\n'
+                       '  [o] Sobrescrever todos\n'
+                       '  [i] Decidir arquivo por arquivo\n'
+                       'Escolha: ').strip().lower()
+        if choice == 's':
+            global_skip_all = True
+        elif choice == 'o':
+            global_overwrite_all = True
+        elif choice != 'i':
+            print('Opção inválida. Use s, o ou i.')
+            continue
+        break
+    
+    to_download = []
+    to_skip = []
+    to_link = []
+    canonical_paths = {}  # {url: primeiro caminho local}
+    for year, resource, output_path, file_size in entries:
+        # Mesma URL listada duas vezes no mesmo ano: mesmo caminho, já tratado na primeira entrada
+        if canonical_paths.get(resource['url']) == output_path:
+            continue
+        
+        action = _automatic_action(file_size, resource['url'])
+        if action is None:
+            action, global_skip_all, global_overwrite_all = handle_existing_file(
+                output_path, global_skip_all, global_overwrite_all, url=resource['url']
+            )
+        
+        if action == 'skip':
+            print(f'  Pulando: {output_path}')
+            to_skip.append((year, resource, output_path))
+            canonical_paths.setdefault(resource['url'], output_path)
+            continue
+        
+        if resource['url'] in canonical_paths:
+            print(f'  Mesmo arquivo de {canonical_paths[resource["url"]]}, será vinculado: {output_path}')
+            to_link.append((year, resource, output_path, canonical_paths[resource['url']]))
+            continue
+        canonical_paths[resource['url']] = output_path
+        
+        if action == 'resume':
+            print(f'  Download incompleto, será retomado: {output_path}')
+        
+        to_download.append((year, resource, output_path, action == 'resume'))
+    
+    return (to_download, to_skip, to_link)
+
+
+def parse_args():
+    """Lê os argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description='Download de arquivos de dados eleitorais do TSE')
+    parser.add_argument('-r', '--refresh', action='store_true', dest='refresh', default=False,
+                        help=f'ignora as listas de recursos salvas ({RESOURCES_CACHE.format(dataset="<dataset>")}) e busca novamente no portal')
+    return parser.parse_args()
+
+
 def main():
     """Função principal"""
+    args = parse_args()
+    
     print(time.asctime(), f'Início de {sys.argv[0]}:')
     print('='*60)
     
@@ -387,75 +957,60 @@ def main():
     total_failed = 0
     failed_downloads = []
     
-    # Flags globais para tratamento de arquivos existentes
-    global_skip_all = False
-    global_overwrite_all = False
+    # Obter recursos de todos os anos em paralelo (somente rede, sem interação)
+    print(f'{time.asctime()} - Buscando recursos de {len(selected_years)} ano(s)...')
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS_SCRAPE) as executor:
+        scraped_years = list(executor.map(lambda yu: scrape_year(*yu, refresh=args.refresh), selected_years))
     
-    # Processar cada ano
-    for year_idx, (year, year_url) in enumerate(selected_years, 1):
-        print(f'\n{time.asctime()} - Processando ano {year_idx}/{len(selected_years)}: {year}')
-        print('-'*60)
-        
-        # Criar diretório do ano
-        year_dir = setup_directories(year=year)
-        
-        # Obter recursos do ano
-        resources = get_resources_from_year(year_url, year)
-        
+    for year, year_url, resources in scraped_years:
         if not resources:
-            print(f'  Nenhum recurso encontrado para {year}')
-            continue
+            print(f'  Nenhum recurso encontrado para {year} ({year_url})')
+    
+    # Montar o plano de downloads (todas as perguntas antes de iniciar)
+    print(f'\n{time.asctime()} - Verificando arquivos existentes...')
+    to_download, to_skip, to_link = plan_downloads(scraped_years)
+    total_skipped = len(to_skip)
+    
+    # Baixar arquivos concorrentemente
+    failed_paths = set()
+    if to_download:
+        print(f'\n{time.asctime()} - Baixando {len(to_download)} arquivo(s)...')
+        results = asyncio.run(_download_all(to_download))
         
-        # Processar cada recurso
-        for res_idx, resource in enumerate(resources, 1):
-            print(f'\n  Recurso {res_idx}/{len(resources)}: {resource["name"]}')
-            
-            # Construir caminho do arquivo
-            output_path = os.path.join(year_dir, resource['name'])
-            
-            # Verificar se arquivo já existe
-            action, global_skip_all, global_overwrite_all = handle_existing_file(
-                output_path, global_skip_all, global_overwrite_all
-            )
-            
-            if action == 'skip':
-                print(f'    Pulando: {resource["name"]}')
-                total_skipped += 1
-                continue
-            
-            # Baixar arquivo com retry
-            max_retries = 3
-            success = False
-            
-            for attempt in range(1, max_retries + 1):
-                if attempt > 1:
-                    print(f'    Tentativa {attempt}/{max_retries}...')
-                    time.sleep(2 ** attempt)  # Backoff exponencial
-                
-                success, error_msg = download_file(resource['url'], output_path)
-                
-                if success:
-                    total_downloaded += 1
-                    print(f'    ✓ Baixado: {resource["name"]}')
-                    break
-                else:
-                    if attempt < max_retries:
-                        print(f'    ✗ Erro: {error_msg} - Tentando novamente...')
-                    else:
-                        print(f'    ✗ Falha após {max_retries} tentativas: {error_msg}')
-                        total_failed += 1
-                        failed_downloads.append({
-                            'year': year,
-                            'filename': resource['name'],
-                            'url': resource['url'],
-                            'error': error_msg
-                        })
+        for (year, resource, output_path, resume), (success, error_msg) in zip(to_download, results):
+            if success:
+                total_downloaded += 1
+            else:
+                total_failed += 1
+                failed_paths.add(output_path)
+                failed_downloads.append({
+                    'year': year,
+                    'filename': resource['name'],
+                    'url': resource['url'],
+                    'error': error_msg
+                })
+    
+    # Vincular arquivos repetidos ao já baixado (hardlink, ou cópia se em outro disco)
+    total_linked = 0
+    for year, resource, output_path, source_path in to_link:
+        if source_path in failed_paths or not os.path.exists(source_path):
+            total_failed += 1
+            failed_downloads.append({
+                'year': year,
+                'filename': resource['name'],
+                'url': resource['url'],
+                'error': f'arquivo de origem indisponível: {source_path}'
+            })
+            continue
+        link_or_copy(source_path, output_path)
+        total_linked += 1
     
     # Resumo final
     print('\n' + '='*60)
     print('RESUMO DO DOWNLOAD')
     print('='*60)
     print(f'Total baixado: {total_downloaded}')
+    print(f'Total vinculado (repetido): {total_linked}')
     print(f'Total pulado: {total_skipped}')
     print(f'Total falhou: {total_failed}')
     print('='*60)